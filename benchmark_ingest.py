@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+from price_index import PriceIndexBuilder
+from upload import ingest
+
+DISHES = [
+    "Galouti Kebab",
+    "Chicken Biryani",
+    "Paneer Tikka",
+    "Butter Chicken",
+    "Veg Burger",
+    "Margherita Pizza",
+    "Gulab Jamun",
+    "Mango Lassi",
+    "Dal Makhani",
+    "Garlic Naan",
+    "Chicken Wings",
+    "Chocolate Lava Cake",
+]
+
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """Cheap hashing embeddings for measuring pipeline overhead only."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def __call__(self, input):
+        vectors = np.zeros((len(input), self.dim), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in text.split():
+                vectors[row, hash(token) % self.dim] += 1.0
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1.0)
+        return [vector for vector in vectors]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_synthetic_restaurants(path, count, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            menu = [
+                {
+                    "name": f"{dish} {j}",
+                    "description": None,
+                    "price": (
+                        f"₹ {rng.uniform(20, 900):.2f}" if rng.random() > 0.1 else None
+                    ),
+                }
+                for j, dish in enumerate(rng.sample(DISHES, 8))
+            ]
+            record = {
+                "name": f"Synthetic Restaurant {i}",
+                "locations": [f"{i} Test Road, Lucknow"],
+                "menu": menu,
+                "hours": "11:00 AM - 11:00 PM",
+                "contact": {"phone": f"+91 {9000000000 + i}"},
+                "special": [],
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming ingest")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument(
+        "--model-embeddings",
+        action="store_true",
+        help="embed with the real default model instead of hashing embeddings",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        input_path = os.path.join(workdir, "restaurants.jsonl")
+        write_synthetic_restaurants(input_path, args.count)
+        size_mb = os.path.getsize(input_path) / (1024 * 1024)
+        print(f"Wrote {args.count} synthetic restaurants ({size_mb:.1f} MB)")
+        rss_before = peak_rss_mb()
+
+        start = time.perf_counter()
+        price_builder = PriceIndexBuilder()
+        restaurants, total_docs = ingest(
+            input_path,
+            persist_dir=os.path.join(workdir, "chroma_db"),
+            collection_name="benchmark",
+            batch_size=args.batch_size,
+            checkpoint_path=os.path.join(workdir, "checkpoint.json"),
+            embedding_function=(
+                None if args.model_embeddings else HashingEmbeddingFunction()
+            ),
+            price_index=price_builder,
+        )
+        price_index = price_builder.build()
+        price_index.save(os.path.join(workdir, "price_index.npz"))
+        elapsed = time.perf_counter() - start
+
+    print(f"Restaurants ingested: {restaurants}")
+    print(f"Documents upserted:   {total_docs}")
+    print(f"Priced menu items:    {len(price_index.prices)}")
+    print(f"Elapsed:              {elapsed:.1f} s")
+    print(f"Throughput:           {total_docs / elapsed:.1f} docs/s")
+    print(
+        f"Peak RSS:             {peak_rss_mb():.1f} MB (before ingest {rss_before:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
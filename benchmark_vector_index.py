@@ -0,0 +1,120 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import chromadb
+from vector_index import MmapIndexWriter, MmapVectorStore
+
+SECTIONS = ["starters", "mains", "desserts", "beverages", "breads", "rice"]
+
+
+def synthetic_corpus(count, dim, restaurants, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc_{i}" for i in range(count)]
+    documents = [f"Synthetic document {i}" for i in range(count)]
+    metadatas = [
+        {
+            "name": f"Restaurant {i % restaurants}",
+            "type": "menu_section",
+            "section": SECTIONS[i % len(SECTIONS)],
+        }
+        for i in range(count)
+    ]
+    return ids, documents, metadatas, vectors
+
+
+def time_queries(search, queries, wheres):
+    latencies, results = [], []
+    for query, where in zip(queries, wheres):
+        start = time.perf_counter()
+        results.append(search(query, where))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.asarray(latencies)
+    return latencies.mean(), np.percentile(latencies, 95), results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the memory-mapped index against ChromaDB"
+    )
+    parser.add_argument("--count", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    ids, documents, metadatas, vectors = synthetic_corpus(
+        args.count, args.dim, args.restaurants
+    )
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    filtered = [
+        {"name": f"Restaurant {rng.integers(args.restaurants)}"}
+        for _ in range(args.queries)
+    ]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        client = chromadb.PersistentClient(os.path.join(workdir, "chroma_db"))
+        collection = client.create_collection("benchmark")
+        batch = 5000
+        for start in range(0, args.count, batch):
+            end = start + batch
+            collection.add(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=vectors[start:end],
+            )
+
+        stores = {}
+        for label, quantize in (("mmap float32", False), ("mmap int8", True)):
+            path = os.path.join(workdir, label.replace(" ", "_"))
+            writer = MmapIndexWriter(path, args.dim, quantize=quantize)
+            writer.add(ids, documents, metadatas, vectors)
+            writer.close()
+            stores[label] = MmapVectorStore(path)
+
+        def chroma_search(query, where):
+            result = collection.query(
+                query_embeddings=[query], n_results=args.k, where=where
+            )
+            return [int(doc_id.split("_")[1]) for doc_id in result["ids"][0]]
+
+        # The float32 index is exact, so it runs first and serves as ground truth.
+        searches = {}
+        for label, store in stores.items():
+            searches[label] = lambda query, where, store=store: [
+                position for position, _ in store.search_vector(query, args.k, where)
+            ]
+        searches["chroma"] = chroma_search
+
+        print(
+            f"{args.count} vectors, dim {args.dim}, k={args.k}, "
+            f"{args.queries} queries per run"
+        )
+        for run, wheres in (
+            ("unfiltered", [None] * args.queries),
+            ("name filter", filtered),
+        ):
+            exact = None
+            for label, search in searches.items():
+                mean, p95, results = time_queries(search, queries, wheres)
+                exact = exact or results
+                recall = np.mean(
+                    [
+                        len(set(got) & set(want)) / max(1, len(want))
+                        for got, want in zip(results, exact)
+                    ]
+                )
+                print(
+                    f"{run:12s} {label:13s} mean {mean:7.3f} ms  "
+                    f"p95 {p95:7.3f} ms  recall@{args.k} {recall:.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import sys
+import argparse
+from price_index import PriceIndex, answer_price_query
+from retrieval import RestaurantQueryAnalyzer
+from upload import default_input_path, iter_restaurants
+
+# Sample questions with the figures they must produce on the bundled
+# lucknow_restaurants.json. Moti Mahal's menu has no desserts at all, and
+# Tunday Kababi lists three items with a price range that must widen the
+# range without skewing the average.
+CHECKS = [
+    (
+        "What's the price range for Moti Mahal restaurant's dessert menu?",
+        ["No priced menu items found for Moti Mahal Delux (Lucknow) in desserts."],
+    ),
+    (
+        "Price range for pizzas at Domino's",
+        ["39 priced items", "range ₹119 - ₹549", "average ₹328.74"],
+    ),
+    (
+        "What's the price range at Tunday Kababi?",
+        [
+            "15 priced items",
+            "range ₹8 - ₹850",
+            "average ₹336.67 across the 12 fixed-price items",
+            "Assorted Breads (Tunday Kababi (Lucknow)): ₹8 - ₹35",
+        ],
+    ),
+    (
+        "Price range for Tunday Kababi desserts",
+        ["1 priced items", "range ₹40 - ₹100"],
+    ),
+    (
+        "Most expensive dishes at Tunday Kababi",
+        ["- Kebabi Shaan (Tunday Kababi (Lucknow)): ₹850"],
+    ),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check price answers for the sample questions"
+    )
+    parser.add_argument("--input", default=default_input_path())
+    args = parser.parse_args()
+
+    index = PriceIndex.from_restaurants(iter_restaurants(args.input))
+    analyzer = RestaurantQueryAnalyzer(index.restaurants)
+    failures = 0
+    for query, expected in CHECKS:
+        answer = answer_price_query(index, analyzer.analyze(query), query)
+        missing = [text for text in expected if text not in answer]
+        print(f"{'FAIL' if missing else 'ok':4s} {query}")
+        if missing:
+            failures += 1
+            print(f"     missing {missing} in:\n{answer}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
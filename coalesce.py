@@ -0,0 +1,70 @@
+import re
+import hashlib
+import threading
+from concurrent.futures import Future
+
+
+def normalize_question(question):
+    return " ".join(re.sub(r"[^\w\s₹]", " ", question.lower()).split())
+
+
+def request_key(question, history, scope=None):
+    digest = hashlib.sha1()
+    for role, content in history:
+        digest.update(f"{role}\x1f{normalize_question(content)}\x1e".encode("utf-8"))
+    return scope, normalize_question(question), digest.hexdigest()
+
+
+class SingleFlight:
+    """Runs one computation per key; concurrent callers wait for its result.
+
+    Streamlit serves every session from threads of the same process, so a
+    module-level instance deduplicates identical questions across users.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        # The key is released before waiters are woken so that requests
+        # arriving afterwards start a fresh computation.
+        try:
+            result = fn()
+        except BaseException as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        self._release(key)
+        future.set_result(result)
+        return result, False
+
+    def _release(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "computed": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+request_coalescer = SingleFlight()
@@ -0,0 +1,126 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+import numpy as np
+from pydantic import Field, PrivateAttr
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+logger = logging.getLogger("nugget_assistant")
+
+HEADER_PREFIXES = ("Name:", "Menu Section:")
+SECTION_LABELS = {"Locations:", "Menu Items:", "Contact:", "Special Information:"}
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4) if text else 0
+
+
+class LineContextCompressor(BaseDocumentCompressor):
+    embeddings: Any
+    token_budget: int = 600
+    cache_size: int = 20000
+    line_cache: OrderedDict = Field(default_factory=OrderedDict)
+    # The compressor is cached across Streamlit sessions, so the LRU is
+    # shared between threads.
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _embed_lines(self, lines):
+        unique = list(dict.fromkeys(lines))
+        vectors = {}
+        with self._lock:
+            for line in unique:
+                vector = self.line_cache.get(line)
+                if vector is not None:
+                    self.line_cache.move_to_end(line)
+                    vectors[line] = vector
+        missing = [line for line in unique if line not in vectors]
+        if missing:
+            embedded = self.embeddings.embed_documents(missing)
+            with self._lock:
+                for line, vector in zip(missing, embedded):
+                    vector = np.asarray(vector, dtype=np.float32)
+                    vectors[line] = vector / (np.linalg.norm(vector) or 1.0)
+                    self.line_cache[line] = vectors[line]
+                    self.line_cache.move_to_end(line)
+                while len(self.line_cache) > self.cache_size:
+                    self.line_cache.popitem(last=False)
+        return np.stack([vectors[line] for line in lines])
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        headers, candidates = [], []
+        for doc_index, doc in enumerate(documents):
+            doc_headers = []
+            for line_index, line in enumerate(doc.page_content.splitlines()):
+                line = line.strip()
+                if not line or line in SECTION_LABELS:
+                    continue
+                if line.startswith(HEADER_PREFIXES):
+                    doc_headers.append((line_index, line))
+                else:
+                    candidates.append((doc_index, line_index, line))
+            headers.append(doc_headers)
+
+        tokens_before = sum(estimate_tokens(doc.page_content) for doc in documents)
+        ranked = []
+        if candidates:
+            query_vector = np.asarray(
+                self.embeddings.embed_query(query), dtype=np.float32
+            )
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+            lines = [line for _, _, line in candidates]
+            scores = self._embed_lines(lines) @ query_vector
+            ranked = [candidates[i] for i in np.argsort(-scores)]
+
+        used = sum(
+            estimate_tokens(line) for doc_headers in headers for _, line in doc_headers
+        )
+        kept = set()
+
+        # Give every restaurant a fair share of the budget first so comparison
+        # questions are not answered from a single restaurant's lines, then
+        # fill whatever is left with the best remaining lines overall.
+        names = {doc.metadata.get("name") for doc in documents}
+        share = max(0, self.token_budget - used) // max(1, len(names))
+        spent = {}
+        for doc_index, line_index, line in ranked:
+            name = documents[doc_index].metadata.get("name")
+            cost = estimate_tokens(line)
+            if spent.get(name, 0) + cost <= share:
+                spent[name] = spent.get(name, 0) + cost
+                kept.add((doc_index, line_index))
+                used += cost
+        for doc_index, line_index, line in ranked:
+            cost = estimate_tokens(line)
+            if (doc_index, line_index) not in kept and used + cost <= self.token_budget:
+                kept.add((doc_index, line_index))
+                used += cost
+
+        kept_lines = [dict(doc_headers) for doc_headers in headers]
+        for doc_index, line_index, line in candidates:
+            if (doc_index, line_index) in kept:
+                kept_lines[doc_index][line_index] = line
+
+        # A document whose body lines all lost still keeps its headers, so the
+        # agent knows that restaurant was retrieved.
+        compressed = [
+            Document(
+                page_content="\n".join(lines[i] for i in sorted(lines)),
+                metadata=doc.metadata,
+            )
+            for doc, lines in zip(documents, kept_lines)
+            if lines
+        ]
+
+        tokens_after = sum(estimate_tokens(doc.page_content) for doc in compressed)
+        logger.info(
+            f"Context compression: {tokens_before} -> {tokens_after} tokens "
+            f"({tokens_before - tokens_after} saved) across {len(documents)} documents"
+        )
+        return compressed
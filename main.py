@@ -5,6 +5,7 @@ import random
 import logging
 import warnings
 import traceback
+import chromadb
 from langchain import hub
 import streamlit as st
 from dotenv import load_dotenv
@@ -16,12 +17,24 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.retrievers import ContextualCompressionRetriever
 from tenacity import (
     retry,
-    wait_exponential,
     stop_after_attempt,
     retry_if_exception_type,
 )
+from coalesce import request_coalescer, request_key
+from compression import LineContextCompressor
+from price_index import PriceIndex
+from retrieval import (
+    EntityAwareRetriever,
+    RestaurantQueryAnalyzer,
+    load_restaurant_metadata,
+)
+from rate_limit import is_rate_limit_error, rate_limit_state
+from shards import ShardRouter, current_city, load_registry
+from upload import default_input_path, iter_restaurants
+from vector_index import MmapVectorStore, chroma_space, cosine_relevance_fn
 from utils import (
     generate_fallback_response,
     load_chat_history,
@@ -50,36 +63,57 @@ warnings.filterwarnings("ignore")
 load_dotenv()
 
 
+# Only short cooldowns are worth waiting for; anything longer switches the
+# request to the retrieval-only degraded mode straight away.
+MAX_RETRY_COOLDOWN = 3.0
+
+
 class RateLimitAwareGroq(ChatGroq):
+    def invoke(self, *args, **kwargs):
+        try:
+            return call_groq_with_retry(super().invoke, *args, **kwargs)
+        except RateLimitException as e:
+            logger.error(f"Rate limit hit after retries: {str(e)}")
+            raise
+
     def __call__(self, *args, **kwargs):
         try:
             return call_groq_with_retry(super().__call__, *args, **kwargs)
         except RateLimitException as e:
-            st.session_state.rate_limit_hits += 1
             logger.error(f"Rate limit hit after retries: {str(e)}")
             raise
 
 
+def stop_when_cooling_down(retry_state):
+    return rate_limit_state.remaining() > MAX_RETRY_COOLDOWN
+
+
+def wait_for_cooldown(retry_state):
+    return max(1.0, rate_limit_state.remaining())
+
+
 @retry(
-    wait=wait_exponential(multiplier=1, min=2, max=60),
-    stop=stop_after_attempt(5),
+    wait=wait_for_cooldown,
+    stop=stop_after_attempt(3) | stop_when_cooling_down,
     retry=retry_if_exception_type(RateLimitException),
     reraise=True,
 )
 def call_groq_with_retry(llm, *args, **kwargs):
+    if rate_limit_state.is_limited():
+        raise RateLimitException(
+            f"Rate limiter cooling down for {rate_limit_state.remaining():.1f}s"
+        )
     try:
-        return llm(*args, **kwargs)
+        result = llm(*args, **kwargs)
     except Exception as e:
-        error_str = str(e).lower()
-        if (
-            "rate limit" in error_str
-            or "too many requests" in error_str
-            or "429" in error_str
-        ):
-            logger.warning(f"Rate limit hit, retrying: {str(e)}")
+        if is_rate_limit_error(e):
+            rate_limit_state.record_hit(e)
+            logger.warning(f"Rate limit hit: {str(e)}")
             raise RateLimitException(f"Rate limit exceeded: {str(e)}")
         else:
             raise
+    rate_limit_state.record_success()
+    return result
 
 
 try:
@@ -94,6 +128,14 @@ try:
     model_name = "llama-3.3-70b-versatile"
     persist_directory = "./chroma_db"
     collection_name = "restaurants"
+    shard_registry_path = os.getenv("SHARD_REGISTRY", "shards.json")
+    # Only used when there is no shard registry at all.
+    shard_defaults = {
+        "backend": "chroma",
+        "persist_dir": persist_directory,
+        "collection": collection_name,
+        "price_index": "price_index.npz",
+    }
 
     if not os.path.exists(persist_directory):
         logger.warning(f"ChromaDB directory not found at {persist_directory}")
@@ -102,7 +144,7 @@ try:
         )
 
     logger.info(f"Using model: {model_name}")
-    logger.info(f"Using ChromaDB collection: {collection_name}")
+    logger.info(f"Using shard registry: {shard_registry_path}")
 
 except Exception as e:
     logger.critical(f"Error during app initialization: {str(e)}")
@@ -137,6 +179,9 @@ with st.sidebar:
     # if "rate_limit_hits" not in st.session_state:
     #     st.session_state.rate_limit_hits = 0
     # st.sidebar.metric("Rate Limit Events", st.session_state.rate_limit_hits)
+    # coalescing = request_coalescer.stats()
+    # st.sidebar.metric("Coalesced Requests", coalescing["coalesced"])
+    # st.sidebar.metric("In-flight Requests", coalescing["in_flight"])
     # if st.sidebar.button("Reset API Stats"):
     #     st.session_state.rate_limit_hits = 0
     #     st.rerun()
@@ -166,30 +211,108 @@ with chat_container:
             )
 
 
-def initialize_rag_system(groq_key, persist_dir, collection, model):
-    try:
-        logger.info("Initializing RAG system")
-        logger.info(f"Loading embeddings model")
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+def load_price_index(index_path="price_index.npz", data_path=None):
+    if os.path.exists(index_path):
+        logger.info(f"Loading price index from {index_path}")
+        return PriceIndex.load(index_path)
+    data_path = data_path or default_input_path()
+    logger.warning(f"Price index not found at {index_path}, building from {data_path}")
+    return PriceIndex.from_restaurants(iter_restaurants(data_path))
+
 
-        logger.info(f"Connecting to ChromaDB at {persist_dir}")
+def load_vector_store(embeddings, config):
+    if config["backend"] == "mmap":
+        index_dir = config["index_dir"]
+        logger.info(f"Opening memory-mapped vector index at {index_dir}")
         try:
-            searcher = Chroma(
-                persist_directory=persist_dir,
-                collection_name=collection,
-                embedding_function=embeddings,
-            )
-            logger.info(f"Successfully connected to ChromaDB collection: {collection}")
+            store = MmapVectorStore(index_dir, embedding_function=embeddings)
+            return store, store.close
         except Exception as e:
-            logger.error(f"Failed to connect to ChromaDB: {str(e)}")
+            logger.error(f"Failed to open memory-mapped index: {str(e)}")
             logger.error(traceback.format_exc())
-            raise RuntimeError(f"ChromaDB connection failed: {str(e)}")
+            raise RuntimeError(f"Memory-mapped index loading failed: {str(e)}")
+
+    persist_dir, collection = config["persist_dir"], config["collection"]
+    logger.info(f"Connecting to ChromaDB at {persist_dir}")
+    try:
+        # Every shard gets its own client so closing it releases the shared
+        # chromadb system (SQLite handles, HNSW index) once nothing else
+        # uses that directory.
+        client = chromadb.PersistentClient(path=persist_dir)
+        space = chroma_space(client.get_or_create_collection(collection))
+        # Scores are merged with other shards, possibly memory-mapped ones,
+        # so report cosine similarity rather than LangChain's L2 default.
+        searcher = Chroma(
+            client=client,
+            collection_name=collection,
+            embedding_function=embeddings,
+            relevance_score_fn=cosine_relevance_fn(space),
+        )
+        logger.info(f"Successfully connected to ChromaDB collection: {collection}")
+        return searcher, client.close
+    except Exception as e:
+        logger.error(f"Failed to connect to ChromaDB: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise RuntimeError(f"ChromaDB connection failed: {str(e)}")
+
+
+def open_city_shard(embeddings, city, config):
+    store, close = load_vector_store(embeddings, config)
+    restaurants = load_restaurant_metadata(store)
+    return {
+        "store": store,
+        "restaurants": restaurants,
+        "analyzer": RestaurantQueryAnalyzer(list(restaurants)),
+        "price_index": load_price_index(config["price_index"], config.get("data")),
+        "close": close,
+    }
+
+
+def refresh_shard_registry(router, registry_path):
+    version = os.path.getmtime(registry_path) if os.path.exists(registry_path) else None
+    if version == router.registry_version:
+        return
+    try:
+        router.update_registry(load_registry(registry_path, shard_defaults), version)
+        logger.info(f"Using city shards: {', '.join(router.cities())}")
+    except Exception as e:
+        logger.error(f"Keeping previous shard registry: {str(e)}")
+
+
+@st.cache_resource(show_spinner=False)
+def load_retrieval_components(registry_path):
+    logger.info("Loading retrieval components")
+    logger.info(f"Loading embeddings model")
+    embeddings = HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2"
+    )
+
+    logger.info("Setting up shard router and retriever")
+    router = ShardRouter(
+        load_registry(registry_path, shard_defaults),
+        lambda city, config: open_city_shard(embeddings, city, config),
+    )
+    retriever = EntityAwareRetriever(vectorstore=router, analyzer=router)
+    compression_retriever = ContextualCompressionRetriever(
+        base_compressor=LineContextCompressor(embeddings=embeddings),
+        base_retriever=retriever,
+    )
+    return {
+        "embeddings": embeddings,
+        "router": router,
+        "retriever": compression_retriever,
+    }
+
+
+def initialize_rag_system(groq_key, components, model):
+    try:
+        logger.info("Initializing RAG system")
+        router = components["router"]
 
         logger.info(f"Initializing Groq LLM with model {model}")
         try:
-            llm = RateLimitAwareGroq(api_key=groq_key, model=model)
+            # Retries are driven by rate_limit_state instead of the client.
+            llm = RateLimitAwareGroq(api_key=groq_key, model=model, max_retries=0)
             logger.info("Successfully initialized Groq LLM")
         except Exception as e:
             logger.error(f"Failed to initialize Groq LLM: {str(e)}")
@@ -212,10 +335,8 @@ def initialize_rag_system(groq_key, persist_dir, collection, model):
             ]
         )
 
-        logger.info("Setting up retriever")
-        retriever = searcher.as_retriever()
         history_aware_retriever = create_history_aware_retriever(
-            llm, retriever, contextualize_q_prompt
+            llm, components["retriever"], contextualize_q_prompt
         )
 
         logger.info("Setting up question-answering chain")
@@ -267,6 +388,15 @@ def initialize_rag_system(groq_key, persist_dir, collection, model):
                 ),
                 description="useful for when you need to answer questions about the context",
             ),
+            Tool(
+                name="Menu Price Lookup",
+                func=router.answer_price_query,
+                description=(
+                    "useful for exact menu price questions: price ranges, averages, "
+                    "cheapest or most expensive items and items under a budget, "
+                    "for a restaurant or menu section"
+                ),
+            ),
             Tool(
                 name="wikipedia",
                 func=search_wikipedia,
@@ -299,6 +429,22 @@ def initialize_rag_system(groq_key, persist_dir, collection, model):
         raise
 
 
+def run_agent(groq_key, components, model, user_query, chat_history):
+    logger.info("Initializing agent executor")
+    agent_executor = initialize_rag_system(groq_key, components, model)
+    time.sleep(0.5)
+    logger.info("Invoking agent executor")
+    try:
+        return agent_executor.invoke(
+            {"input": user_query, "chat_history": chat_history}
+        )
+    except Exception as e:
+        if isinstance(e, RateLimitException) or not is_rate_limit_error(e):
+            raise
+        rate_limit_state.record_hit(e)
+        raise RateLimitException(f"Rate limit exceeded: {str(e)}") from e
+
+
 food_spinner_messages = [
     "Simmering thoughts...",
     "Kneading ideas...",
@@ -323,6 +469,25 @@ food_spinner_messages = [
 ]
 
 
+# Cities come from the cached router, reloaded whenever shards.json changes,
+# so the selector never offers a city the router cannot serve.
+with st.sidebar:
+    try:
+        router = load_retrieval_components(shard_registry_path)["router"]
+        refresh_shard_registry(router, shard_registry_path)
+        cities = router.cities()
+    except Exception as e:
+        logger.error(f"Failed to load city shards: {str(e)}")
+        cities = []
+    if len(cities) > 1:
+        city = st.session_state.get("city")
+        st.session_state.city = st.selectbox(
+            "City",
+            cities,
+            index=cities.index(city if city in cities else router.default_city),
+        )
+
+
 if "chat_history_loaded" not in st.session_state:
     load_chat_history()
     st.session_state.chat_history_loaded = True
@@ -349,18 +514,36 @@ if user_query:
                 else:
                     formatted_history.append(("ai", msg["content"]))
 
+            components = None
             try:
-                logger.info("Initializing agent executor")
-                agent_executor = initialize_rag_system(
-                    groq_api_key,
-                    persist_directory,
-                    collection_name,
-                    model_name,
+                current_city.set(st.session_state.get("city"))
+                components = load_retrieval_components(shard_registry_path)
+                if rate_limit_state.is_limited():
+                    raise RateLimitException(
+                        f"Rate limiter cooling down for {rate_limit_state.remaining():.1f}s"
+                    )
+                response, shared = request_coalescer.do(
+                    request_key(
+                        user_query, formatted_history, st.session_state.get("city")
+                    ),
+                    lambda: run_agent(
+                        groq_api_key,
+                        components,
+                        model_name,
+                        user_query,
+                        formatted_history,
+                    ),
+                )
+                outcome = (
+                    "Reused the answer of an identical in-flight request"
+                    if shared
+                    else "Computed a new answer"
                 )
-                time.sleep(0.5)
-                logger.info("Invoking agent executor")
-                response = agent_executor.invoke(
-                    {"input": user_query, "chat_history": formatted_history}
+                coalescing = request_coalescer.stats()
+                logger.info(
+                    f"{outcome} ({coalescing['computed']} computed, "
+                    f"{coalescing['coalesced']} coalesced, "
+                    f"{coalescing['in_flight']} in flight)"
                 )
                 assistant_response = response["output"]
                 logger.info("Successfully generated response")
@@ -371,10 +554,10 @@ if user_query:
                 # save_chat_history()
 
             except RateLimitException as e:
-                logger.error(f"Rate limit exceeded after retries: {str(e)}")
-                st.session_state.rate_limit_hits += 1
-                fallback_response = generate_fallback_response(user_query)
-                fallback_response += "\n\n(Note: I'm currently experiencing rate limits with my AI service. Please try again in a minute.)"
+                logger.error(f"Answering in degraded mode: {str(e)}")
+                fallback_response = generate_fallback_response(
+                    user_query, components, rate_limit_state.remaining()
+                )
                 st.write(fallback_response)
                 st.session_state.chat_history.append(
                     {"role": "assistant", "content": fallback_response}
@@ -0,0 +1,243 @@
+import re
+
+# Rules are checked in order against the item name only; descriptions list
+# toppings and flavours ("smoky and sweet", "barbeque chicken") that say
+# nothing about where a dish sits on the menu. Dish types come before cooking
+# styles so a "Tandoori Zinger Burger" is a burger and not a kebab.
+MENU_SECTIONS = [
+    (
+        "desserts",
+        [
+            "dessert",
+            "sweet",
+            "kheer",
+            "phirni",
+            "kulfi",
+            "halwa",
+            "gulab jamun",
+            "rasmalai",
+            "ice cream",
+            "sundae",
+            "brownie",
+            "cake",
+            "lava",
+            "choco",
+            "shahi tukda",
+        ],
+    ),
+    (
+        "beverages",
+        [
+            "beverage",
+            "drink",
+            "pepsi",
+            "coke",
+            "lassi",
+            "shake",
+            "chaas",
+            "tea",
+            "coffee",
+            "juice",
+            "soda",
+            "mojito",
+            "cooler",
+            "water",
+            "7up",
+            "mirinda",
+            "fanta",
+            "sprite",
+        ],
+    ),
+    ("pizza", ["pizza", "margherita", "farmhouse", "pepperoni", "extravaganza"]),
+    (
+        "burgers",
+        [
+            "burger",
+            "zinger",
+            "wrap",
+            "roll",
+            "sandwich",
+            "brown bread",
+            "hot dog",
+            "sloppy joe",
+            "taco",
+        ],
+    ),
+    ("mains", ["bowl", "thali", "pasta", "chopsuey"]),
+    ("combos", ["bucket", "meal", "combo", "box", "feast"]),
+    (
+        "starters",
+        [
+            "starter",
+            "appetizer",
+            "popcorn",
+            "nachos",
+            "strips",
+            "wings",
+            "soup",
+            "fries",
+            "garlic bread",
+            "parcel",
+            "dip",
+            "salad",
+        ],
+    ),
+    ("breads", ["naan", "roti", "paratha", "kulcha", "bread", "sheermal"]),
+    ("rice", ["biryani", "rice", "pulao"]),
+]
+
+# Cooking styles and sauces only decide the section when the restaurant has
+# no house speciality, e.g. Domino's "BBQ Chicken" is still a pizza.
+STYLE_SECTIONS = [
+    (
+        "kebabs",
+        [
+            "kebab",
+            "kabab",
+            "seekh",
+            "galouti",
+            "galawati",
+            "boti",
+            "barbeque",
+            "bbq",
+            "tandoori",
+            "tikka",
+        ],
+    ),
+    (
+        "mains",
+        [
+            "curry",
+            "korma",
+            "dal",
+            "makhani",
+            "butter chicken",
+            "paneer",
+            "nihari",
+            "qorma",
+            "gravy",
+            "sauce",
+            "manchurian",
+            "kung pao",
+            "steak",
+            "chicken",
+            "mutton",
+            "lamb",
+            "fish",
+            "prawn",
+        ],
+    ),
+]
+
+# Restaurants named after a dish, whose unlabelled items ("Cloud 9",
+# "Chicken Dominator") belong to that dish.
+HOUSE_SECTIONS = {"pizza": "pizza", "burger": "burgers"}
+
+NOT_DESSERT = re.compile(
+    r"\bsweet\s+(?:n|and|&)\s+sour|\bsweet\s+(?:corn|chilli|potato)"
+)
+
+SECTION_ALIASES = {
+    "desserts": ["dessert", "sweets", "sweet dish"],
+    "beverages": ["beverage", "drink"],
+    "starters": ["starter", "appetizer", "snack", "salad"],
+    "kebabs": ["kebab", "kabab", "barbeque", "bbq"],
+    "breads": ["bread", "naan", "roti"],
+    "rice": ["biryani", "rice"],
+    "pizza": ["pizza"],
+    "burgers": ["burger", "wrap", "sandwich"],
+    "combos": ["combo", "bucket", "meals"],
+    "mains": ["main course", "mains", "curries", "curry"],
+}
+
+# Single words that name a dish, ingredient or menu section. They say what
+# someone wants to eat, so they are never enough to name a restaurant.
+MENU_WORDS = {
+    word
+    for rules in (MENU_SECTIONS, STYLE_SECTIONS, SECTION_ALIASES.items())
+    for section, keywords in rules
+    for word in (section, *keywords)
+    if " " not in word
+} | set(HOUSE_SECTIONS)
+
+
+def is_menu_word(word):
+    return (
+        word in MENU_WORDS
+        or (word.endswith("s") and word[:-1] in MENU_WORDS)
+        or (word.endswith("es") and word[:-2] in MENU_WORDS)
+    )
+
+
+def _keyword_pattern(keywords):
+    # One alternation per section, matched at the start of a word, instead of
+    # a search per keyword: classification runs for every menu item ingested.
+    return re.compile(rf"\b(?:{'|'.join(map(re.escape, keywords))})")
+
+
+MENU_PATTERNS = [
+    (section, _keyword_pattern(keywords)) for section, keywords in MENU_SECTIONS
+]
+STYLE_PATTERNS = [
+    (section, _keyword_pattern(keywords)) for section, keywords in STYLE_SECTIONS
+]
+HOUSE_PATTERNS = [
+    (section, _keyword_pattern([keyword]))
+    for keyword, section in HOUSE_SECTIONS.items()
+]
+ALIAS_PATTERNS = [
+    (section, _keyword_pattern(aliases)) for section, aliases in SECTION_ALIASES.items()
+]
+
+
+def _match_rules(text, patterns):
+    for section, pattern in patterns:
+        if pattern.search(text):
+            return section
+    return None
+
+
+def house_section(restaurant_name):
+    return _match_rules((restaurant_name or "").lower(), HOUSE_PATTERNS)
+
+
+def _classify(item, house):
+    name = (item.get("name") or "").lower().replace("'", "")
+    name = NOT_DESSERT.sub(" ", name)
+    return (
+        _match_rules(name, MENU_PATTERNS)
+        or house
+        or _match_rules(name, STYLE_PATTERNS)
+        or "other"
+    )
+
+
+def classify_menu_item(item, restaurant_name=None):
+    return _classify(item, house_section(restaurant_name))
+
+
+def classify_menu(restaurant):
+    """Returns the section of every item on a restaurant's menu, in order."""
+    house = house_section(restaurant.get("name"))
+    return [_classify(item, house) for item in restaurant.get("menu") or []]
+
+
+def find_sections(text):
+    text = text.lower()
+    return [section for section, pattern in ALIAS_PATTERNS if pattern.search(text)]
+
+
+def parse_price_range(price):
+    """Returns (low, high) for a menu price; both ends are equal unless the
+    menu lists a range such as "₹8 - ₹35"."""
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return (float(price), float(price)) if price > 0 else None
+    if not isinstance(price, str):
+        return None
+    values = [
+        float(match.replace(",", ""))
+        for match in re.findall(r"\d[\d,]*(?:\.\d+)?", price)[:2]
+    ]
+    if not values or values[0] <= 0:
+        return None
+    return values[0], max(values)
@@ -0,0 +1,345 @@
+import re
+import logging
+from array import array
+import numpy as np
+from menu import classify_menu, parse_price_range
+
+logger = logging.getLogger("nugget_assistant")
+
+# Price-range items listed in a summary; an answer about every restaurant
+# would otherwise list thousands of them.
+RANGED_ITEMS_LIMIT = 10
+
+
+def format_price(price):
+    return f"₹{round(float(price), 2):g}"
+
+
+def format_price_range(low, high):
+    if high > low:
+        return f"{format_price(low)} - {format_price(high)}"
+    return format_price(low)
+
+
+def _pack_strings(strings):
+    blob, offsets = bytearray(), array("q", [0])
+    for string in strings:
+        blob += string.encode("utf-8")
+        offsets.append(len(blob))
+    return np.frombuffer(blob, dtype=np.uint8), np.frombuffer(offsets, dtype=np.int64)
+
+
+def _unpack_strings(blob, offsets):
+    data = blob.tobytes()
+    return [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+
+class PriceIndex:
+    """Menu prices as columns sorted by (restaurant, section, price).
+
+    Every (restaurant, section) pair is a contiguous, price-sorted slice, so
+    min/max/top-N inside a group are plain slice lookups. Items listed with a
+    price range keep both ends: ``prices`` holds the low end and
+    ``max_prices`` the high end. Item names live in one UTF-8 blob addressed
+    by ``name_starts``/``name_ends`` instead of a fixed-width string array.
+    """
+
+    def __init__(
+        self,
+        restaurants,
+        sections,
+        restaurant_ids,
+        section_ids,
+        prices,
+        max_prices,
+        name_blob,
+        name_starts,
+        name_ends,
+    ):
+        self.restaurants = [str(name) for name in restaurants]
+        self.sections = [str(section) for section in sections]
+        self.restaurant_lookup = {name: i for i, name in enumerate(self.restaurants)}
+        self.section_lookup = {name: i for i, name in enumerate(self.sections)}
+        self.restaurant_ids = np.asarray(restaurant_ids, dtype=np.int32)
+        self.section_ids = np.asarray(section_ids, dtype=np.int16)
+        self.prices = np.asarray(prices, dtype=np.float32)
+        self.max_prices = np.asarray(max_prices, dtype=np.float32)
+        self.name_blob = np.asarray(name_blob, dtype=np.uint8)
+        self.name_starts = np.asarray(name_starts, dtype=np.int64)
+        self.name_ends = np.asarray(name_ends, dtype=np.int64)
+
+        keys = self.restaurant_ids.astype(np.int64) * len(self.sections)
+        keys += self.section_ids
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate(([0], bounds)).astype(int)
+        ends = np.concatenate((bounds, [len(keys)])).astype(int)
+        self.groups = {}
+        for start, end in zip(starts, ends):
+            if end > start:
+                key = (
+                    int(self.restaurant_ids[start]),
+                    int(self.section_ids[start]),
+                )
+                self.groups[key] = (start, end)
+
+        # Section-major view of the same rows, so a question about a section
+        # across all restaurants is one lookup instead of a scan over every
+        # restaurant's groups.
+        order = np.argsort(self.section_ids, kind="stable")
+        counts = np.bincount(self.section_ids, minlength=len(self.sections))
+        self.section_positions = np.split(order, np.cumsum(counts)[:-1])
+
+    @classmethod
+    def from_restaurants(cls, restaurants):
+        builder = PriceIndexBuilder()
+        for restaurant in restaurants:
+            builder.add(restaurant)
+        return builder.build()
+
+    def save(self, path):
+        restaurant_blob, restaurant_offsets = _pack_strings(self.restaurants)
+        section_blob, section_offsets = _pack_strings(self.sections)
+        np.savez(
+            path,
+            restaurant_blob=restaurant_blob,
+            restaurant_offsets=restaurant_offsets,
+            section_blob=section_blob,
+            section_offsets=section_offsets,
+            restaurant_ids=self.restaurant_ids,
+            section_ids=self.section_ids,
+            prices=self.prices,
+            max_prices=self.max_prices,
+            name_blob=self.name_blob,
+            name_starts=self.name_starts,
+            name_ends=self.name_ends,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if "item_names" in data.files:
+                return cls._load_fixed_width(data)
+            return cls(
+                _unpack_strings(data["restaurant_blob"], data["restaurant_offsets"]),
+                _unpack_strings(data["section_blob"], data["section_offsets"]),
+                data["restaurant_ids"],
+                data["section_ids"],
+                data["prices"],
+                data["max_prices"],
+                data["name_blob"],
+                data["name_starts"],
+                data["name_ends"],
+            )
+
+    @classmethod
+    def _load_fixed_width(cls, data):
+        # Indexes written before names were packed into a blob.
+        name_blob, name_offsets = _pack_strings(str(n) for n in data["item_names"])
+        prices = data["prices"]
+        return cls(
+            data["restaurants"],
+            data["sections"],
+            data["restaurant_ids"],
+            data["section_ids"],
+            prices,
+            data["max_prices"] if "max_prices" in data.files else prices,
+            name_blob,
+            name_offsets[:-1],
+            name_offsets[1:],
+        )
+
+    def item_name(self, position):
+        start, end = self.name_starts[position], self.name_ends[position]
+        return self.name_blob[start:end].tobytes().decode("utf-8")
+
+    def select(self, restaurants=None, sections=None):
+        if not restaurants and not sections:
+            return np.arange(len(self.prices))
+        if not restaurants:
+            ranges = [
+                self.section_positions[self.section_lookup[s]]
+                for s in sections
+                if s in self.section_lookup
+            ]
+            return np.concatenate(ranges) if ranges else np.arange(0)
+        restaurant_ids = [
+            self.restaurant_lookup[r]
+            for r in restaurants
+            if r in self.restaurant_lookup
+        ]
+        section_ids = (
+            [self.section_lookup[s] for s in sections if s in self.section_lookup]
+            if sections
+            else range(len(self.sections))
+        )
+        ranges = [
+            np.arange(*self.groups[key])
+            for key in (
+                (restaurant_id, section_id)
+                for restaurant_id in restaurant_ids
+                for section_id in section_ids
+            )
+            if key in self.groups
+        ]
+        return np.concatenate(ranges) if ranges else np.arange(0)
+
+    def stats(self, positions, ranged_limit=RANGED_ITEMS_LIMIT):
+        if not len(positions):
+            return None
+        prices = self.prices[positions]
+        max_prices = self.max_prices[positions]
+        fixed = prices == max_prices
+        ranged = positions[~fixed]
+        # A ranged item has no single price, so it widens min/max but is left
+        # out of the average.
+        return {
+            "count": int(len(prices)),
+            "min": float(prices.min()),
+            "max": float(max_prices.max()),
+            "mean": float(prices[fixed].mean()) if fixed.any() else None,
+            "fixed": int(fixed.sum()),
+            "ranged": int(len(ranged)),
+            "ranged_items": [self.item(position) for position in ranged[:ranged_limit]],
+        }
+
+    def top(self, positions, n=5, cheapest=True):
+        if not len(positions):
+            return []
+        keys = self.prices[positions] if cheapest else -self.max_prices[positions]
+        n = min(n, len(keys))
+        best = np.argpartition(keys, n - 1)[:n]
+        best = best[np.argsort(keys[best], kind="stable")]
+        return [self.item(positions[i]) for i in best]
+
+    def under(self, positions, limit, n=10):
+        positions = positions[self.prices[positions] <= limit]
+        return self.top(positions, n=n, cheapest=False)
+
+    def item(self, position):
+        return {
+            "restaurant": self.restaurants[self.restaurant_ids[position]],
+            "section": self.sections[self.section_ids[position]],
+            "name": self.item_name(position),
+            "price": float(self.prices[position]),
+            "max_price": float(self.max_prices[position]),
+        }
+
+
+class PriceIndexBuilder:
+    """Collects price columns one restaurant at a time, so the index can be
+    built in the same streaming pass that feeds the vector store."""
+
+    def __init__(self):
+        self.restaurant_lookup, self.section_lookup = {}, {}
+        self.restaurant_ids, self.section_ids = array("i"), array("h")
+        self.prices, self.max_prices = array("f"), array("f")
+        self.name_blob, self.name_offsets = bytearray(), array("q", [0])
+        self.skipped = 0
+
+    def add(self, restaurant, sections=None):
+        """Adds a restaurant's priced items. ``sections`` is the output of
+        ``classify_menu`` when the caller has already classified the menu."""
+        name = restaurant.get("name", "Unknown")
+        restaurant_id = self.restaurant_lookup.setdefault(
+            name, len(self.restaurant_lookup)
+        )
+        if sections is None:
+            sections = classify_menu(restaurant)
+        for item, section in zip(restaurant.get("menu") or [], sections):
+            price = parse_price_range(item.get("price"))
+            if price is None:
+                self.skipped += 1
+                continue
+            self.restaurant_ids.append(restaurant_id)
+            self.section_ids.append(
+                self.section_lookup.setdefault(section, len(self.section_lookup))
+            )
+            self.prices.append(price[0])
+            self.max_prices.append(price[1])
+            self.name_blob += item.get("name", "Unnamed Item").encode("utf-8")
+            self.name_offsets.append(len(self.name_blob))
+
+    def build(self):
+        restaurant_ids = np.frombuffer(self.restaurant_ids, dtype=np.int32)
+        section_ids = np.frombuffer(self.section_ids, dtype=np.int16)
+        prices = np.frombuffer(self.prices, dtype=np.float32)
+        max_prices = np.frombuffer(self.max_prices, dtype=np.float32)
+        offsets = np.frombuffer(self.name_offsets, dtype=np.int64)
+        order = np.lexsort((prices, section_ids, restaurant_ids))
+        logger.info(
+            f"Built price index with {len(prices)} priced items "
+            f"({self.skipped} items without a usable price skipped)"
+        )
+        return PriceIndex(
+            list(self.restaurant_lookup),
+            list(self.section_lookup),
+            restaurant_ids[order],
+            section_ids[order],
+            prices[order],
+            max_prices[order],
+            np.frombuffer(self.name_blob, dtype=np.uint8),
+            offsets[:-1][order],
+            offsets[1:][order],
+        )
+
+
+def _format_items(items):
+    return "\n".join(
+        f"- {item['name']} ({item['restaurant']}): "
+        f"{format_price_range(item['price'], item['max_price'])}"
+        for item in items
+    )
+
+
+def answer_price_query(index, analysis, query):
+    q = query.lower()
+    count = re.search(
+        r"\b(?:top|first)\s+(\d+)|\b(\d+)\s+(?:cheapest|most|items|dishes)", q
+    )
+    n = int(next(group for group in count.groups() if group)) if count else 5
+    limit = re.search(
+        r"\b(?:under|below|less than|within|up ?to)\s*(?:rs\.?|₹|inr)?\s*(\d+)", q
+    )
+    restaurants = analysis.get("restaurants") or [None]
+    sections = analysis.get("sections") or None
+    scope = f" in {', '.join(sections)}" if sections else ""
+
+    answers = []
+    for restaurant in restaurants:
+        positions = index.select([restaurant] if restaurant else None, sections)
+        label = (restaurant or "all restaurants") + scope
+        stats = index.stats(positions)
+        if stats is None:
+            answers.append(f"No priced menu items found for {label}.")
+        elif limit:
+            items = index.under(positions, float(limit.group(1)), n=max(n, 10))
+            answers.append(
+                f"Items at or under {format_price(limit.group(1))} for {label}:\n"
+                + (_format_items(items) or "- none")
+            )
+        elif re.search(r"cheap|lowest|least expensive|budget", q):
+            answers.append(
+                f"Cheapest items for {label}:\n{_format_items(index.top(positions, n))}"
+            )
+        elif re.search(r"expensive|costl|priciest|highest|premium", q):
+            items = index.top(positions, n, cheapest=False)
+            answers.append(f"Most expensive items for {label}:\n{_format_items(items)}")
+        else:
+            summary = (
+                f"Prices for {label}: {stats['count']} priced items, "
+                f"range {format_price(stats['min'])} - {format_price(stats['max'])}"
+            )
+            if stats["mean"] is not None:
+                summary += f", average {format_price(stats['mean'])}"
+                if stats["ranged"]:
+                    summary += f" across the {stats['fixed']} fixed-price items"
+            summary += "."
+            if stats["ranged"]:
+                summary += "\nListed with a price range:\n" + _format_items(
+                    stats["ranged_items"]
+                )
+                hidden = stats["ranged"] - len(stats["ranged_items"])
+                if hidden:
+                    summary += f"\n- ...and {hidden} more"
+            answers.append(summary)
+    return "\n\n".join(answers)
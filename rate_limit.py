@@ -0,0 +1,96 @@
+import re
+import time
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger("nugget_assistant")
+
+RATE_LIMIT_MARKERS = ("rate limit", "too many requests", "429")
+UNIT_SECONDS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+def is_rate_limit_error(error):
+    error_str = str(error).lower()
+    return any(marker in error_str for marker in RATE_LIMIT_MARKERS)
+
+
+def parse_retry_after(message):
+    # Groq reports waits such as "Please try again in 7.66s", "in 1m2.5s"
+    # or, for short per-minute token limits, "in 520ms".
+    match = re.search(r"try again in ((?:\d+(?:\.\d+)?(?:ms|h|m|s))+)", str(message))
+    if not match:
+        return None
+    return sum(
+        float(value) * UNIT_SECONDS[unit]
+        for value, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", match.group(1))
+    )
+
+
+def _header_retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def retry_after(error):
+    """Seconds the API asked us to wait, preferring the ``retry-after``
+    header of the underlying HTTP response over hints in the message."""
+    if isinstance(error, BaseException):
+        cause, seen = error, set()
+        while cause is not None and id(cause) not in seen:
+            seen.add(id(cause))
+            wait = _header_retry_after(cause)
+            if wait is not None:
+                return wait
+            cause = cause.__cause__ or cause.__context__
+    return parse_retry_after(error)
+
+
+class RateLimitState:
+    """Process-wide view of the LLM quota shared by every Streamlit session."""
+
+    def __init__(self, base_cooldown=10.0, max_cooldown=120.0):
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown_until = 0.0
+        self.consecutive_hits = 0
+        self.total_hits = 0
+        self._lock = threading.Lock()
+
+    def record_hit(self, error=""):
+        with self._lock:
+            self.total_hits += 1
+            self.consecutive_hits += 1
+            wait = retry_after(error)
+            if wait is None:
+                wait = self.base_cooldown * 2 ** (self.consecutive_hits - 1)
+            wait = min(wait, self.max_cooldown)
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + wait)
+            logger.warning(
+                f"Rate limit hit #{self.total_hits}, cooling down for {wait:.1f}s"
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_hits = 0
+
+    def remaining(self):
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def is_limited(self):
+        return self.remaining() > 0
+
+
+rate_limit_state = RateLimitState()
@@ -0,0 +1,184 @@
+import re
+import logging
+import difflib
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from menu import find_sections, is_menu_word
+
+logger = logging.getLogger("nugget_assistant")
+
+# Generic first words of restaurant names; on their own they would match
+# ordinary questions ("the best", "good food", "a royal feast").
+ALIAS_STOPWORDS = {
+    "the",
+    "cafe",
+    "restaurant",
+    "hotel",
+    "kitchen",
+    "new",
+    "best",
+    "good",
+    "food",
+    "foods",
+    "royal",
+    "grand",
+    "classic",
+    "famous",
+    "house",
+    "home",
+    "taste",
+    "tasty",
+    "spice",
+    "hot",
+    "fresh",
+    "green",
+    "golden",
+    "big",
+    "little",
+    "urban",
+    "city",
+    "street",
+    "corner",
+    "express",
+    "king",
+    "special",
+}
+
+
+def normalize_text(text):
+    text = re.sub(r"\(.*?\)", " ", text.lower()).replace("'", "")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def load_restaurant_metadata(vectorstore):
+    result = vectorstore.get(where={"type": "restaurant"}, include=["metadatas"])
+    restaurants = {m["name"]: m for m in result["metadatas"] if m and m.get("name")}
+    logger.info(f"Loaded {len(restaurants)} restaurants for query analysis")
+    return restaurants
+
+
+def build_where(restaurant=None, sections=None):
+    clauses = []
+    if restaurant:
+        clauses.append({"name": restaurant})
+    if sections:
+        clauses.append(
+            {"section": sections[0]}
+            if len(sections) == 1
+            else {"section": {"$in": sections}}
+        )
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class RestaurantQueryAnalyzer:
+    def __init__(self, restaurant_names, threshold=0.85):
+        self.threshold = threshold
+        owners = {}
+        for name in restaurant_names:
+            tokens = normalize_text(name).split()
+            for size in range(1, len(tokens) + 1):
+                alias = " ".join(tokens[:size])
+                # A lone first word only names a restaurant when it is
+                # distinctive ("tunday"), not a dish or a common word
+                # ("biryani" in "Biryani Blues").
+                if size == 1 and (
+                    len(alias) < 3 or alias in ALIAS_STOPWORDS or is_menu_word(alias)
+                ):
+                    continue
+                owners.setdefault(alias, set()).add(name)
+
+        # Prefixes shared by several restaurants are ambiguous; keep only the
+        # ones that point at a single restaurant, bucketed by first letter so
+        # fuzzy matching stays cheap as the restaurant list grows.
+        self.aliases = {}
+        for alias, names in owners.items():
+            if len(names) == 1:
+                self.aliases.setdefault(alias[0], []).append(
+                    (alias, len(alias.split()), next(iter(names)))
+                )
+
+    def _match(self, tokens):
+        best = {}
+        for start, token in enumerate(tokens):
+            for alias, size, name in self.aliases.get(token[0], []):
+                window = " ".join(tokens[start : start + size])
+                score = difflib.SequenceMatcher(None, window, alias).ratio()
+                # Prefer the longest alias so the whole name is covered.
+                if (
+                    score >= self.threshold
+                    and (size, score) > best.get(name, (0, 0))[:2]
+                ):
+                    best[name] = (size, score, start)
+        return sorted(best.items(), key=lambda kv: kv[1][2])
+
+    def analyze(self, query):
+        tokens = normalize_text(query).split()
+        matches = self._match(tokens)
+        # Restaurant names such as "Tunday Kababi" or "Domino's Pizza" must not
+        # be read as menu sections, so look for sections outside the names.
+        covered = set()
+        for _, (size, _, start) in matches:
+            covered.update(range(start, start + size))
+        remainder = " ".join(t for i, t in enumerate(tokens) if i not in covered)
+        return {
+            "restaurants": [name for name, _ in matches],
+            "sections": find_sections(remainder),
+        }
+
+
+class EntityAwareRetriever(BaseRetriever):
+    vectorstore: Any
+    analyzer: Any
+    k: int = 4
+    per_entity_k: int = 3
+
+    def _search(self, query, k, restaurant, sections):
+        where = build_where(restaurant)
+        docs = self.vectorstore.similarity_search(query, k=k, filter=where)
+        if not docs and where is not None:
+            logger.info(f"No documents matched filter {where}, relaxing")
+            docs = self.vectorstore.similarity_search(query, k=k)
+        if not sections:
+            return docs
+
+        # Menu sections come from keyword rules, so they only boost matching
+        # section documents instead of filtering everything else out.
+        section_where = build_where(restaurant, sections)
+        section_docs = self.vectorstore.similarity_search(
+            query, k=max(1, k // 2), filter=section_where
+        )
+        if not section_docs:
+            logger.info(f"No documents matched filter {section_where}")
+        seen = {doc.page_content for doc in section_docs}
+        others = [doc for doc in docs if doc.page_content not in seen]
+        return section_docs + others[: k - len(section_docs)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        analysis = self.analyzer.analyze(query)
+        restaurants = analysis["restaurants"]
+        sections = analysis["sections"]
+        logger.info(f"Query analysis: restaurants={restaurants}, sections={sections}")
+
+        if len(restaurants) > 1:
+            docs = []
+            for restaurant in restaurants:
+                docs.extend(
+                    self._search(query, self.per_entity_k, restaurant, sections)
+                )
+        else:
+            restaurant = restaurants[0] if restaurants else None
+            docs = self._search(query, self.k, restaurant, sections)
+
+        seen = set()
+        unique_docs = []
+        for doc in docs:
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                unique_docs.append(doc)
+        return unique_docs
@@ -323,20 +323,21 @@ def scrape_motimahal_delux():
     return data
 
 
-restaurants = []
-for fn in (
-    scrape_kfc,
-    scrape_dominos,
-    scrape_tunday_kababi,
-    scrape_motimahal_delux,
-):
-    try:
-        info = fn()
-        restaurants.append(info)
-    except Exception as ex:
-        print(f"Error scraping {fn.__name__}: {ex}")
-
-with open("lucknow_restaurants.json", "w", encoding="utf-8") as f:
-    json.dump(restaurants, f, indent=2, ensure_ascii=False)
+# Records are written as JSON Lines while scraping so a long crawl never has
+# to hold every restaurant in memory and a crash keeps what was scraped.
+with open("lucknow_restaurants.jsonl", "w", encoding="utf-8") as f:
+    for fn in (
+        scrape_kfc,
+        scrape_dominos,
+        scrape_tunday_kababi,
+        scrape_motimahal_delux,
+    ):
+        try:
+            info = fn()
+        except Exception as ex:
+            print(f"Error scraping {fn.__name__}: {ex}")
+            continue
+        f.write(json.dumps(info, ensure_ascii=False) + "\n")
+        f.flush()
 
-print("Scraping complete. Data saved to lucknow_restaurants.json.")
+print("Scraping complete. Data saved to lucknow_restaurants.jsonl.")
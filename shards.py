@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from price_index import answer_price_query
+from retrieval import normalize_text
+
+logger = logging.getLogger("nugget_assistant")
+
+DEFAULT_REGISTRY = "shards.json"
+
+# City picked for the current Streamlit session; used when the question
+# itself does not name a city.
+current_city = contextvars.ContextVar("current_city", default=None)
+
+
+# Keys a shard entry needs for each vector backend, on top of price_index.
+# Missing keys are an error rather than inherited from another city, which
+# would silently answer from the wrong city's data.
+REQUIRED_KEYS = {"chroma": ("persist_dir", "collection"), "mmap": ("index_dir",)}
+
+
+def load_registry(path=DEFAULT_REGISTRY, defaults=None):
+    if not os.path.exists(path):
+        logger.warning(f"Shard registry not found at {path}, using a single shard")
+        return {"default_city": "lucknow", "shards": {"lucknow": dict(defaults or {})}}
+    with open(path, "r") as f:
+        registry = json.load(f)
+    for city, config in registry["shards"].items():
+        backend = config.setdefault("backend", "chroma")
+        if backend not in REQUIRED_KEYS:
+            raise ValueError(f"Unknown vector backend {backend!r} for {city} in {path}")
+        missing = [
+            key
+            for key in ("price_index", *REQUIRED_KEYS[backend])
+            if not config.get(key)
+        ]
+        if missing:
+            raise ValueError(f"Shard {city} in {path} is missing {', '.join(missing)}")
+    registry.setdefault("default_city", next(iter(registry["shards"])))
+    return registry
+
+
+def register_shard(city, config, path=DEFAULT_REGISTRY):
+    registry = {"default_city": city, "shards": {}}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            registry = json.load(f)
+    registry["shards"][city] = {**registry["shards"].get(city, {}), **config}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+class ShardRouter:
+    """Routes questions to per-city shards that are opened lazily.
+
+    ``open_shard(city, config)`` returns a dict with ``store``, ``restaurants``,
+    ``analyzer``, ``price_index`` and optionally ``close``, a callable that
+    releases the shard's files and database handles. Shards unused for
+    ``idle_ttl`` seconds, beyond ``max_loaded`` (least recently used first) or
+    whose registry entry changed are closed once no request is using them.
+    """
+
+    def __init__(self, registry, open_shard, idle_ttl=900, max_loaded=8, max_workers=8):
+        self.open_shard = open_shard
+        self.idle_ttl = idle_ttl
+        self.max_loaded = max_loaded
+        self.configs = {}
+        self.registry_version = None
+        self._loaded = OrderedDict()
+        self._last_used = {}
+        self._active = {}
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.update_registry(registry)
+
+    def update_registry(self, registry, version=None):
+        aliases = {}
+        for city, config in registry["shards"].items():
+            for alias in [city, *config.get("aliases", [])]:
+                aliases[normalize_text(alias)] = city
+        with self._lock:
+            self._stale.update(
+                city
+                for city in self._loaded
+                if registry["shards"].get(city) != self.configs.get(city)
+            )
+            self.configs = registry["shards"]
+            self.default_city = registry["default_city"]
+            self.aliases = aliases
+            self.registry_version = version
+            for city in self.configs:
+                self._load_locks.setdefault(city, threading.Lock())
+        self.evict_idle()
+
+    def cities(self):
+        return list(self.configs)
+
+    def route(self, query=""):
+        text = f" {normalize_text(query)} "
+        cities = []
+        for alias, city in self.aliases.items():
+            if f" {alias} " in text and city not in cities:
+                cities.append(city)
+        if cities:
+            return cities
+        city = current_city.get()
+        return [city if city in self.configs else self.default_city]
+
+    def _checkout(self, city):
+        # Caller holds self._lock.
+        shard = self._loaded.get(city)
+        if shard is not None:
+            self._loaded.move_to_end(city)
+            self._last_used[city] = time.monotonic()
+            self._active[city] = self._active.get(city, 0) + 1
+        return shard
+
+    def _acquire(self, city):
+        with self._lock:
+            shard = self._checkout(city)
+        if shard is None:
+            with self._load_locks[city]:
+                with self._lock:
+                    shard = self._checkout(city)
+                if shard is None:
+                    logger.info(f"Loading shard for {city}")
+                    shard = self.open_shard(city, self.configs[city])
+                    with self._lock:
+                        self._loaded[city] = shard
+                        self._stale.discard(city)
+                        self._checkout(city)
+        return shard
+
+    def _release(self, city):
+        with self._lock:
+            self._active[city] -= 1
+        self.evict_idle()
+
+    def use(self, city, fn):
+        shard = self._acquire(city)
+        try:
+            return fn(shard)
+        finally:
+            self._release(city)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for city in list(self._loaded):
+                if self._active.get(city):
+                    continue
+                stale = city in self._stale or city not in self.configs
+                idle = now - self._last_used[city] > self.idle_ttl
+                if stale or idle or len(self._loaded) > self.max_loaded:
+                    evicted.append((city, self._loaded.pop(city)))
+                    del self._last_used[city]
+                    self._stale.discard(city)
+        for city, shard in evicted:
+            logger.info(f"Closing shard for {city}")
+            try:
+                if shard.get("close"):
+                    shard["close"]()
+            except Exception as e:
+                logger.warning(f"Failed to close shard for {city}: {str(e)}")
+
+    def _map(self, fn, cities):
+        if len(cities) == 1:
+            return [self.use(cities[0], fn)]
+        return list(self._executor.map(lambda city: self.use(city, fn), cities))
+
+    def analyze(self, query):
+        analyses = self._map(
+            lambda shard: shard["analyzer"].analyze(query), self.route(query)
+        )
+        restaurants = []
+        for analysis in analyses:
+            restaurants += [r for r in analysis["restaurants"] if r not in restaurants]
+        # Each shard only strips its own restaurant names before looking for
+        # menu sections, so keep the sections every shard agrees on.
+        sections = [
+            section
+            for section in analyses[0]["sections"]
+            if all(section in analysis["sections"] for analysis in analyses)
+        ]
+        return {"restaurants": restaurants, "sections": sections}
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        cities = self.route(query)
+        results = self._map(
+            lambda shard: shard["store"].similarity_search_with_relevance_scores(
+                query, k=k, filter=filter
+            ),
+            cities,
+        )
+        merged = sorted(
+            (pair for result in results for pair in result), key=lambda pair: -pair[1]
+        )
+        return [doc for doc, _ in merged[:k]]
+
+    def restaurant_metadata(self, query=""):
+        restaurants = {}
+        for shard_restaurants in self._map(
+            lambda shard: shard["restaurants"], self.route(query)
+        ):
+            restaurants.update(shard_restaurants)
+        return restaurants
+
+    def answer_price_query(self, query):
+        return "\n\n".join(
+            self._map(
+                lambda shard: answer_price_query(
+                    shard["price_index"], shard["analyzer"].analyze(query), query
+                ),
+                self.route(query),
+            )
+        )
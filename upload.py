@@ -1,52 +1,92 @@
+import os
 import json
+import time
+import argparse
 import chromadb
 from chromadb.utils import embedding_functions
+from menu import classify_menu
+from price_index import PriceIndexBuilder
+from shards import DEFAULT_REGISTRY, load_registry, register_shard
 
-with open("lucknow_restaurants.json", "r") as file:
-    restaurants_data = json.load(file)
+DEFAULT_PERSIST_DIR = "./chroma_db"
+DEFAULT_COLLECTION = "restaurants"
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_CHECKPOINT = "ingest_checkpoint.json"
 
-client = chromadb.PersistentClient("./chroma_db")
 
-embedding_function = embedding_functions.DefaultEmbeddingFunction()
+def default_input_path():
+    if os.path.exists("lucknow_restaurants.jsonl"):
+        return "lucknow_restaurants.jsonl"
+    return "lucknow_restaurants.json"
 
-restaurant_collection = client.create_collection(
-    name="restaurants",
-    embedding_function=embedding_function,
-    metadata={"description": "Restaurant information in Lucknow"},
-)
 
-for i, restaurant in enumerate(restaurants_data):
-    restaurant_text = f"Name: {restaurant.get('name', 'N/A')}\n"
+def _iter_json_array(file, chunk_size=1 << 16):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while True:
+        chunk = file.read(chunk_size)
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n[,]":
+                pos += 1
+            if pos == len(buffer):
+                break
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield record
+        buffer = buffer[pos:]
+        if not chunk:
+            return
+
+
+def iter_restaurants(path):
+    with open(path, "r", encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(file)
+
+
+def _menu_item_line(item):
+    parts = [f"- {item.get('name', 'Unnamed Item')}"]
+    if item.get("description"):
+        parts.append(f": {item['description']}")
+    if item.get("price"):
+        parts.append(f" ({item['price']})")
+    return "".join(parts)
+
+
+def build_documents(restaurant, i, sections=None):
+    name = restaurant.get("name", "N/A")
+    lines = [f"Name: {name}"]
 
     if restaurant.get("locations"):
-        restaurant_text += "Locations:\n"
-        for location in restaurant["locations"]:
-            restaurant_text += f"- {location}\n"
+        lines.append("Locations:")
+        lines.extend(f"- {location}" for location in restaurant["locations"])
 
     if restaurant.get("menu"):
-        restaurant_text += "Menu Items:\n"
-        for item in restaurant["menu"]:
-            item_text = f"- {item.get('name', 'Unnamed Item')}"
-            description = item.get("description")
-            if description:
-                item_text += f": {description}"
-            price = item.get("price")
-            if price:
-                item_text += f" ({price})"
-            restaurant_text += item_text + "\n"
+        lines.append("Menu Items:")
+        lines.extend(_menu_item_line(item) for item in restaurant["menu"])
 
     if restaurant.get("hours"):
-        restaurant_text += f"Hours: {restaurant['hours']}\n"
+        lines.append(f"Hours: {restaurant['hours']}")
 
     if restaurant.get("contact"):
-        restaurant_text += "Contact:\n"
-        for key, value in restaurant["contact"].items():
-            restaurant_text += f"- {key}: {value}\n"
+        lines.append("Contact:")
+        lines.extend(
+            f"- {key}: {value}" for key, value in restaurant["contact"].items()
+        )
 
     if restaurant.get("special"):
-        restaurant_text += "Special Information:\n"
-        for special in restaurant["special"]:
-            restaurant_text += f"- {special}\n"
+        lines.append("Special Information:")
+        lines.extend(f"- {special}" for special in restaurant["special"])
 
     metadata = {
         "name": restaurant.get("name", "Unknown"),
@@ -56,14 +96,198 @@ for i, restaurant in enumerate(restaurants_data):
     if restaurant.get("hours"):
         metadata["hours"] = restaurant["hours"]
 
-    restaurant_collection.add(
-        documents=[restaurant_text], metadatas=[metadata], ids=[f"restaurant_{i+1}"]
+    documents = [(f"restaurant_{i+1}", "\n".join(lines) + "\n", metadata)]
+
+    if sections is None:
+        sections = classify_menu(restaurant)
+    section_items = {}
+    for item, section in zip(restaurant.get("menu") or [], sections):
+        section_items.setdefault(section, []).append(item)
+
+    for section, items in section_items.items():
+        section_lines = [f"Name: {name}", f"Menu Section: {section}"]
+        section_lines.extend(_menu_item_line(item) for item in items)
+        documents.append(
+            (
+                f"restaurant_{i+1}_{section}",
+                "\n".join(section_lines) + "\n",
+                {**metadata, "type": "menu_section", "section": section},
+            )
+        )
+    return documents
+
+
+def _load_checkpoint(checkpoint_path, input_path):
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        print(f"Ignoring checkpoint for a different input: {checkpoint.get('input')}")
+        return 0
+    return checkpoint.get("records", 0)
+
+
+def _save_checkpoint(checkpoint_path, input_path, records):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"input": os.path.abspath(input_path), "records": records}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def ingest(
+    input_path,
+    persist_dir=DEFAULT_PERSIST_DIR,
+    collection_name=DEFAULT_COLLECTION,
+    batch_size=DEFAULT_BATCH_SIZE,
+    checkpoint_path=DEFAULT_CHECKPOINT,
+    resume=False,
+    embedding_function=None,
+    city="Lucknow",
+    price_index=None,
+):
+    client = chromadb.PersistentClient(persist_dir)
+    collection = client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=embedding_function
+        or embedding_functions.DefaultEmbeddingFunction(),
+        metadata={"description": f"Restaurant information in {city}"},
     )
 
+    skip = _load_checkpoint(checkpoint_path, input_path) if resume else 0
+    if skip:
+        print(f"Resuming after {skip} restaurants")
+
+    ids, documents, metadatas = [], [], []
+    records = skip
+    total_docs = 0
+    start = time.perf_counter()
+
+    def flush():
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+        _save_checkpoint(checkpoint_path, input_path, records)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Upserted {total_docs} documents from {records} restaurants "
+            f"({total_docs / elapsed:.1f} docs/s)"
+        )
+        ids.clear()
+        documents.clear()
+        metadatas.clear()
+
+    for i, restaurant in enumerate(iter_restaurants(input_path)):
+        # Price columns are collected in the same pass, including restaurants
+        # a resumed run skips, so the index always covers the whole input.
+        sections = classify_menu(restaurant)
+        if price_index is not None:
+            price_index.add(restaurant, sections)
+        if i < skip:
+            continue
+        for doc_id, text, metadata in build_documents(restaurant, i, sections):
+            ids.append(doc_id)
+            documents.append(text)
+            metadatas.append(metadata)
+        records = i + 1
+        # Batches are only cut at restaurant boundaries so the checkpoint
+        # always points at the first restaurant that is not fully stored.
+        if len(ids) >= batch_size:
+            total_docs += len(ids)
+            flush()
+
+    if ids:
+        total_docs += len(ids)
+        flush()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return records - skip, total_docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest restaurants into ChromaDB")
+    parser.add_argument("--input", default=default_input_path())
+    parser.add_argument("--persist-dir")
+    parser.add_argument("--collection")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--checkpoint")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--price-index")
+    parser.add_argument("--city", help="register the collection as this city's shard")
+    parser.add_argument("--aliases", nargs="*")
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+
+    # A city keeps the paths it was registered with; a new city gets its own
+    # directory and price index so it never upserts over another city's
+    # documents (ids are only unique within one input file).
+    city = args.city.lower() if args.city else None
+    if city:
+        shards = {}
+        if os.path.exists(args.registry):
+            shards = load_registry(args.registry)["shards"]
+        config = {
+            "persist_dir": f"./chroma_db_{city}",
+            "collection": DEFAULT_COLLECTION,
+            "price_index": f"price_index_{city}.npz",
+            **shards.get(city, {}),
+        }
+        args.persist_dir = args.persist_dir or config["persist_dir"]
+        args.collection = args.collection or config["collection"]
+        args.price_index = args.price_index or config["price_index"]
+        args.checkpoint = args.checkpoint or f"ingest_checkpoint_{city}.json"
+        for other, other_config in shards.items():
+            if other == city:
+                continue
+            if (other_config.get("persist_dir"), other_config.get("collection")) == (
+                args.persist_dir,
+                args.collection,
+            ) or other_config.get("price_index") == args.price_index:
+                parser.error(
+                    f"{args.persist_dir}/{args.collection} or {args.price_index} "
+                    f"already belongs to the {other} shard"
+                )
+    args.persist_dir = args.persist_dir or DEFAULT_PERSIST_DIR
+    args.price_index = args.price_index or "price_index.npz"
+    args.collection = args.collection or DEFAULT_COLLECTION
+    args.checkpoint = args.checkpoint or DEFAULT_CHECKPOINT
+
+    price_builder = PriceIndexBuilder()
+    restaurants, total_docs = ingest(
+        args.input,
+        persist_dir=args.persist_dir,
+        collection_name=args.collection,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        city=(city or "lucknow").title(),
+        price_index=price_builder,
+    )
+    print(
+        f"Successfully added {restaurants} restaurants ({total_docs} documents) "
+        f"to ChromaDB collection"
+    )
+
+    price_index = price_builder.build()
+    price_index.save(args.price_index)
+    print(f"Saved price index with {len(price_index.prices)} priced items")
+
+    if city:
+        register_shard(
+            city,
+            {
+                "backend": "chroma",
+                "persist_dir": args.persist_dir,
+                "collection": args.collection,
+                "price_index": args.price_index,
+                "data": args.input,
+                # Keep aliases from an earlier registration unless new ones
+                # are given.
+                **({"aliases": args.aliases} if args.aliases is not None else {}),
+            },
+            path=args.registry,
+        )
+        print(f"Registered {args.city} shard in {args.registry}")
 
-print(f"Successfully added {len(restaurants_data)} restaurants to ChromaDB collection")
 
-# results = restaurant_collection.query(
-#     query_texts=["what is the price of kebab?"], n_results=10
-# )
-# print(results)
+if __name__ == "__main__":
+    main()
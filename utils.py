@@ -1,5 +1,5 @@
-import random
 import os
+import re
 import streamlit as st
 import logging
 import json
@@ -27,20 +27,82 @@ def load_chat_history():
         st.session_state.chat_history = []
 
 
-def generate_fallback_response(user_query):
-    generic_responses = [
-        "I'm having trouble connecting to my knowledge base right now. Could you try asking again in a moment?",
-        "It seems like we're experiencing some technical difficulties. Let me try to help with what I know: restaurants generally offer a variety of cuisines and price points. Could you provide more details about what you're looking for?",
-        "I apologize, but I'm having trouble accessing the restaurant database at the moment. Is there something specific about dining options you'd like to know?",
-        "We're experiencing a high volume of requests right now. Would you mind trying your question again in a few moments?",
-    ]
-    if any(word in user_query.lower() for word in ["italian", "pasta", "pizza"]):
-        return "I'm having trouble connecting to my knowledge base, but I can tell you're interested in Italian cuisine. Italian restaurants typically offer dishes like pasta, pizza, risotto, and many feature antipasti appetizers. Would you like me to try finding specific information once the connection is restored?"
-    if any(word in user_query.lower() for word in ["vegan", "vegetarian", "plant"]):
-        return "While I'm experiencing connection issues, I notice you're interested in plant-based options. Many restaurants now offer dedicated vegan/vegetarian menus or can modify dishes to accommodate dietary preferences. Would you like to know about specific plant-based dishes once I'm back online?"
-    if any(
-        word in user_query.lower()
-        for word in ["price", "expensive", "cheap", "cost", "budget"]
-    ):
-        return "I see you're asking about pricing. While I can't access specific restaurant prices right now due to connection issues, restaurants typically range from budget-friendly options to high-end dining experiences. I'd be happy to provide more specific information once the connection is restored."
-    return random.choice(generic_responses)
+PRICE_PATTERN = re.compile(
+    r"\b(?:prices?|priced|pricing|costs?|costly|cheap(?:er|est)?|expensive"
+    r"|budget|afford(?:able)?|average|rs|inr)\b"
+    r"|\b(?:under|below|less than)\s*(?:rs\.?|inr|₹)?\s*\d|₹"
+)
+# "close to"/"close by" is about location, not closing time.
+HOURS_PATTERN = re.compile(
+    r"\b(?:timings?|hours|open(?:s|ed|ing)?|clos(?:e|es|ed|ing))\b"
+    r"(?!\s+(?:to|by)\b)"
+)
+SNIPPET_LINES_PER_RESTAURANT = 8
+
+
+def _format_hours(restaurants, names):
+    lines = ["Opening hours:"]
+    for name in names:
+        hours = restaurants.get(name, {}).get("hours")
+        lines.append(f"- {name}: {hours or 'hours not listed'}")
+    return "\n".join(lines)
+
+
+def _format_snippets(documents):
+    snippets = {}
+    for doc in documents:
+        name = doc.metadata.get("name", "Restaurant")
+        lines = snippets.setdefault(name, [])
+        for line in doc.page_content.splitlines():
+            line = line.strip()
+            if line.startswith("- ") and line not in lines:
+                lines.append(line)
+    if not snippets:
+        return ""
+    return "Here's what I found in the menus:\n\n" + "\n\n".join(
+        f"**{name}**\n" + "\n".join(lines[:SNIPPET_LINES_PER_RESTAURANT])
+        for name, lines in snippets.items()
+    )
+
+
+def generate_fallback_response(user_query, components=None, retry_in=0):
+    wait = f"about {max(1, round(retry_in))} seconds" if retry_in else "a minute"
+    note = (
+        "\n\n(My AI service is busy right now, so this answer comes straight from "
+        f"our restaurant data. Please try again in {wait} for a full answer.)"
+    )
+    if not components:
+        return (
+            "I'm having trouble reaching my AI service and the restaurant data right "
+            f"now. Please try again in {wait}."
+        )
+
+    try:
+        router = components["router"]
+        analysis = router.analyze(user_query)
+        query = user_query.lower()
+        parts = []
+        if HOURS_PATTERN.search(query):
+            names = analysis["restaurants"]
+            # Listing every restaurant's hours helps nobody, so ask instead.
+            parts.append(
+                _format_hours(router.restaurant_metadata(user_query), names)
+                if names
+                else "Tell me which restaurant you have in mind and I'll share "
+                "its opening hours."
+            )
+        if PRICE_PATTERN.search(query):
+            parts.append(router.answer_price_query(user_query))
+        if not parts:
+            parts.append(_format_snippets(components["retriever"].invoke(user_query)))
+    except Exception as e:
+        logger.error(f"Degraded response failed: {str(e)}")
+        parts = []
+
+    if not any(parts):
+        return (
+            "I couldn't find anything in our restaurant data for that question. "
+            f"Please try again in {wait}."
+        )
+    logger.info("Answered from restaurant data without the LLM")
+    return "\n\n".join(part for part in parts if part) + note
@@ -0,0 +1,379 @@
+import os
+import json
+import mmap
+import logging
+import argparse
+from typing import Any, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from shards import DEFAULT_REGISTRY, load_registry, register_shard
+
+logger = logging.getLogger("nugget_assistant")
+
+METADATA_FIELDS = ("name", "type", "section", "hours")
+MISSING = -1
+SCORE_CHUNK_ROWS = 65536
+# int8 rows are widened to float32 before the dot product, so they are
+# scored in smaller chunks: 4096 x 384 dims is a 6 MB temporary.
+QUANTIZED_CHUNK_ROWS = 4096
+
+
+def chroma_space(collection):
+    configuration = getattr(collection, "configuration", None) or {}
+    space = (configuration.get("hnsw") or {}).get("space")
+    return space or (collection.metadata or {}).get("hnsw:space", "l2")
+
+
+def cosine_relevance_fn(space):
+    """Maps a Chroma distance back to the cosine similarity that
+    MmapVectorStore reports, so scores from both backends can be merged.
+
+    all-MiniLM-L6-v2 embeddings are unit length, so squared L2 distance is
+    2 - 2 * cosine.
+    """
+    if space == "l2":
+        return lambda distance: 1.0 - distance / 2.0
+    return lambda distance: 1.0 - distance
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class MmapIndexWriter:
+    """Appends rows to an index directory without holding them in memory."""
+
+    def __init__(self, path, dim, quantize=False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.quantize = quantize
+        self.count = 0
+        self.vocab = {field: {} for field in METADATA_FIELDS}
+        self.codes = {field: [] for field in METADATA_FIELDS}
+        self.offsets = []
+        self.vectors = open(
+            os.path.join(path, "embeddings.i8" if quantize else "embeddings.f32"), "wb"
+        )
+        self.scales = open(os.path.join(path, "scales.f32"), "wb") if quantize else None
+        self.documents = open(os.path.join(path, "documents.jsonl"), "wb")
+
+    def add(self, ids, documents, metadatas, embeddings):
+        vectors = _normalize(embeddings).reshape(-1, self.dim)
+        if self.quantize:
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+            self.vectors.write(quantized.tobytes())
+            self.scales.write(scales.astype(np.float32).tobytes())
+        else:
+            self.vectors.write(vectors.tobytes())
+
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            metadata = metadata or {}
+            for field in METADATA_FIELDS:
+                value = metadata.get(field)
+                vocab = self.vocab[field]
+                self.codes[field].append(
+                    MISSING if value is None else vocab.setdefault(value, len(vocab))
+                )
+            self.offsets.append(self.documents.tell())
+            record = {"id": doc_id, "document": document, "metadata": metadata}
+            self.documents.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            self.documents.write(b"\n")
+        self.count += len(vectors)
+
+    def close(self):
+        self.vectors.close()
+        if self.scales:
+            self.scales.close()
+        self.documents.close()
+        np.save(
+            os.path.join(self.path, "offsets.npy"), np.asarray(self.offsets, np.int64)
+        )
+        np.save(
+            os.path.join(self.path, "metadata_codes.npy"),
+            np.asarray(
+                [self.codes[field] for field in METADATA_FIELDS], np.int32
+            ).reshape(len(METADATA_FIELDS), self.count),
+        )
+        manifest = {
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": "int8" if self.quantize else "float32",
+            "fields": list(METADATA_FIELDS),
+            "vocab": {field: list(vocab) for field, vocab in self.vocab.items()},
+        }
+        with open(os.path.join(self.path, "manifest.json"), "w") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        logger.info(f"Wrote {self.count} vectors to memory-mapped index at {self.path}")
+
+
+class MmapVectorStore(VectorStore):
+    """Exact top-k search over normalized embeddings in memory-mapped files.
+
+    The embedding matrix is opened read-only with ``np.memmap`` so every worker
+    process shares the same pages from the OS cache. Metadata filters use the
+    Chroma ``where`` syntax for the fields ``upload.py`` writes.
+    """
+
+    def __init__(self, path, embedding_function: Optional[Embeddings] = None):
+        self.path = path
+        self.embedding_function = embedding_function
+        with open(os.path.join(path, "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        self.count = manifest["count"]
+        self.dim = manifest["dim"]
+        self.quantized = manifest["dtype"] == "int8"
+        self.fields = {field: i for i, field in enumerate(manifest["fields"])}
+        self.vocab = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in manifest["vocab"].items()
+        }
+
+        shape = (self.count, self.dim)
+        if self.quantized:
+            self.vectors = np.memmap(
+                os.path.join(path, "embeddings.i8"), np.int8, "r", shape=shape
+            )
+            self.scales = np.memmap(
+                os.path.join(path, "scales.f32"), np.float32, "r", shape=(self.count,)
+            )
+        else:
+            self.vectors = np.memmap(
+                os.path.join(path, "embeddings.f32"), np.float32, "r", shape=shape
+            )
+            self.scales = None
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.codes = np.load(os.path.join(path, "metadata_codes.npy"), mmap_mode="r")
+        with open(os.path.join(path, "documents.jsonl"), "rb") as f:
+            self.documents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        logger.info(
+            f"Opened memory-mapped index at {path}: {self.count} vectors, "
+            f"dim {self.dim}, {manifest['dtype']}"
+        )
+
+    def close(self):
+        # numpy unmaps a memmap once no array refers to it any more.
+        self.vectors = self.scales = self.offsets = self.codes = None
+        self.documents.close()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def _field_mask(self, field, condition):
+        if field not in self.fields:
+            raise ValueError(f"Unsupported metadata filter field: {field}")
+        codes = self.codes[self.fields[field]]
+        vocab = self.vocab[field]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        operator, value = next(iter(condition.items()))
+        if operator in ("$eq", "$ne"):
+            mask = codes == vocab.get(value, -2)
+            return ~mask if operator == "$ne" else mask
+        if operator in ("$in", "$nin"):
+            mask = np.isin(codes, [vocab[v] for v in value if v in vocab])
+            return ~mask if operator == "$nin" else mask
+        raise ValueError(f"Unsupported metadata filter operator: {operator}")
+
+    def filter_mask(self, where):
+        if not where:
+            return None
+        masks = []
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                sub_masks = [self.filter_mask(clause) for clause in condition]
+                combine = np.logical_and if key == "$and" else np.logical_or
+                masks.append(combine.reduce(sub_masks))
+            else:
+                masks.append(self._field_mask(key, condition))
+        return np.logical_and.reduce(masks)
+
+    def _scores(self, rows, query):
+        count = self.count if rows is None else len(rows)
+        chunk_rows = QUANTIZED_CHUNK_ROWS if self.quantized else SCORE_CHUNK_ROWS
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, chunk_rows):
+            end = min(start + chunk_rows, count)
+            block = slice(start, end) if rows is None else rows[start:end]
+            scores[start:end] = self._score_block(block, query)
+        return scores
+
+    def _score_block(self, rows, query):
+        if self.quantized:
+            block = self.vectors[rows].astype(np.float32)
+            return (block @ query) * self.scales[rows]
+        return self.vectors[rows] @ query
+
+    def search_vector(self, vector, k=4, where=None):
+        query = _normalize(vector)
+        mask = self.filter_mask(where)
+        rows = None if mask is None else np.flatnonzero(mask)
+        if rows is not None and not len(rows):
+            return []
+        scores = self._scores(rows, query)
+        k = min(k, len(scores))
+        if not k:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        positions = best if rows is None else rows[best]
+        return [(int(p), float(1.0 - scores[b])) for p, b in zip(positions, best)]
+
+    def _record(self, position):
+        start = int(self.offsets[position])
+        end = self.documents.find(b"\n", start)
+        return json.loads(self.documents[start:end])
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        results = []
+        for position, distance in self.search_vector(embedding, k, filter):
+            record = self._record(position)
+            results.append(
+                (
+                    Document(
+                        page_content=record["document"], metadata=record["metadata"]
+                    ),
+                    distance,
+                )
+            )
+        return results
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, filter)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_by_vector_with_score(
+                embedding, k, filter
+            )
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    def get(self, where=None, include=None):
+        mask = self.filter_mask(where)
+        positions = range(self.count) if mask is None else np.flatnonzero(mask)
+        records = [self._record(int(p)) for p in positions]
+        return {
+            "ids": [record["id"] for record in records],
+            "documents": [record["document"] for record in records],
+            "metadatas": [record["metadata"] for record in records],
+        }
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        raise NotImplementedError(
+            "MmapVectorStore is read-only; rebuild it with from_texts or export_from_chroma"
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        path: str = "./vector_index",
+        quantize: bool = False,
+        **kwargs: Any,
+    ) -> "MmapVectorStore":
+        texts = list(texts)
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        writer = MmapIndexWriter(path, vectors.shape[1], quantize=quantize)
+        writer.add(
+            ids or [str(i) for i in range(len(texts))],
+            texts,
+            metadatas or [{} for _ in texts],
+            vectors,
+        )
+        writer.close()
+        return cls(path, embedding_function=embedding)
+
+
+def export_from_chroma(
+    persist_dir, collection_name, out_dir, quantize=False, batch_size=1000
+):
+    import chromadb
+
+    collection = chromadb.PersistentClient(persist_dir).get_collection(collection_name)
+    total = collection.count()
+    writer = None
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=batch_size,
+            offset=offset,
+        )
+        embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+        if writer is None:
+            writer = MmapIndexWriter(out_dir, embeddings.shape[1], quantize=quantize)
+        writer.add(batch["ids"], batch["documents"], batch["metadatas"], embeddings)
+    if writer is None:
+        raise ValueError(f"Collection {collection_name} in {persist_dir} is empty")
+    writer.close()
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export a ChromaDB collection to a memory-mapped vector index"
+    )
+    parser.add_argument("--persist-dir")
+    parser.add_argument("--collection")
+    parser.add_argument("--out")
+    parser.add_argument("--int8", action="store_true", help="store int8 embeddings")
+    parser.add_argument(
+        "--city", help="export this city's shard and switch it to the index"
+    )
+    parser.add_argument("--registry", default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+
+    config = {}
+    if args.city:
+        config = load_registry(args.registry)["shards"][args.city.lower()]
+    persist_dir = args.persist_dir or config.get("persist_dir", "./chroma_db")
+    collection = args.collection or config.get("collection", "restaurants")
+    out = args.out or (
+        f"./vector_index_{args.city.lower()}" if args.city else "./vector_index"
+    )
+
+    count = export_from_chroma(persist_dir, collection, out, quantize=args.int8)
+    print(f"Exported {count} vectors from {collection} to {out}")
+
+    if args.city:
+        register_shard(
+            args.city.lower(), {"backend": "mmap", "index_dir": out}, args.registry
+        )
+        print(f"Switched the {args.city} shard to {out} in {args.registry}")
+
+
+if __name__ == "__main__":
+    main()